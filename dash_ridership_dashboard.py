@@ -1,36 +1,134 @@
+import numpy as np
+import orjson
 import pandas as pd
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output
+import plotly.io as pio
+import pyarrow as pa
+from dash import Dash, DiskcacheManager, dcc, html, Input, Output, State, no_update
 from dash.dash_table import DataTable
+from flask_caching import Cache
+import diskcache
+from numba import njit
+from plotly_resampler import FigureResampler
 import holidays
 import datetime
+import os
+import urllib.request
+from collections import defaultdict
 
-# Load and clean the data
+# Source CSV, the local cache of the cleaned dataset, and the upstream ETag
+# recorded when the cache was written
 file_path = 'https://raw.githubusercontent.com/lwyay/Ridership-Dashboard/main/Daily%20Ridership%20-%20Data%20View%20(1).csv'
-data = pd.read_csv(file_path, encoding='utf-16', delimiter='\t', header=1)
+cache_path = 'ridership_cache.arrow'
+etag_path = cache_path + '.etag'
 
-# Convert the 'Date' column to datetime
-data['Date'] = pd.to_datetime(data['Date'], errors='coerce')
+month_names = [
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+]
+day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
-# Remove commas and convert numeric columns to integers
-for column in ['Bus', 'Rail', 'Grand Total']:
-    data[column] = data[column].str.replace(',', '').astype(int)
+# The columns the dashboard actually reads; everything else is pruned
+used_columns = ['Date', 'Bus', 'Rail', 'Grand Total', 'MonthNum', 'Year', 'DayOfWeek', 'Holiday_Name', 'Holiday']
 
-# Add Month, Year, and Day of Week columns for filtering and hover
-data['Month'] = data['Date'].dt.month_name()
-data['Year'] = data['Date'].dt.year
-data['Day'] = data['Date'].dt.day_name()
+def _clean_data():
+    # thousands=',' lets the C parser decode Bus/Rail/Grand Total straight to
+    # integers, skipping a per-column str.replace(',', '').astype(int) pass
+    frame = pd.read_csv(file_path, encoding='utf-16', delimiter='\t', header=1, thousands=',')
 
-# Generate US holidays for the years in the dataset
-us_holidays = holidays.US(years=range(data['Year'].min(), data['Year'].max() + 1))
-holiday_data = pd.DataFrame(
-    [{'Date': date, 'Holiday_Name': name} for date, name in us_holidays.items()]
-)
-holiday_data['Date'] = pd.to_datetime(holiday_data['Date'])
+    # Convert the 'Date' column to datetime (explicit format avoids per-row inference)
+    frame['Date'] = pd.to_datetime(frame['Date'], format='%B %d, %Y', errors='coerce')
+
+    # Daily counts fit comfortably in int32; halving the element size halves
+    # the memory traffic of every mask and reduction over these columns
+    for column in ['Bus', 'Rail', 'Grand Total']:
+        frame[column] = frame[column].astype(np.int32)
+
+    # Add month, year, and day-of-week columns for filtering and hover; the
+    # month and weekday are kept as int8 codes and only rendered as names at
+    # display time via the month_names/day_names lookup tables
+    frame['MonthNum'] = frame['Date'].dt.month.astype('int8')
+    frame['Year'] = frame['Date'].dt.year
+    frame['DayOfWeek'] = frame['Date'].dt.dayofweek.astype('int8')
+
+    # Attach holiday names with a single vectorized lookup; holiday lookup is a
+    # point function, so a hash-join merge over the whole frame is overkill
+    us_holidays = holidays.US(years=range(frame['Year'].min(), frame['Year'].max() + 1))
+    holiday_map = {pd.Timestamp(date): name for date, name in us_holidays.items()}
+    frame['Holiday_Name'] = frame['Date'].map(holiday_map)
+    frame['Holiday'] = pd.Categorical(
+        np.where(frame['Holiday_Name'].notna(), 'Yes', 'No'),
+        categories=['Yes', 'No']
+    )
+
+    return frame.sort_values('Date')[used_columns]
+
+def _remote_etag():
+    # Best-effort HEAD request for the upstream CSV's ETag; None means the
+    # remote (or the header) could not be read
+    try:
+        request = urllib.request.Request(file_path, method='HEAD')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.headers.get('ETag')
+    except OSError:
+        return None
 
-# Merge holidays with the main data
-data = pd.merge(data, holiday_data, on='Date', how='left')
-data['Holiday'] = data['Holiday_Name'].notna().replace({True: 'Yes', False: 'No'})
+def _cache_is_fresh(remote_etag):
+    # The cache is stale once the upstream ETag moves past the one recorded
+    # at write time; if either side cannot be determined, keep serving the
+    # cached data rather than failing or re-downloading on every start
+    if remote_etag is None:
+        return True
+    try:
+        with open(etag_path) as stored:
+            return stored.read().strip() == remote_etag
+    except OSError:
+        return True
+
+def _load_data():
+    # Every worker restart used to re-download the CSV, decode utf-16, and
+    # redo the string parsing; cache the cleaned frame as an Arrow IPC file
+    # and memory-map it, so all gunicorn workers read the same page-cache
+    # buffers instead of each materializing its own copy
+    table = None
+    remote_etag = _remote_etag()
+    if os.path.exists(cache_path) and _cache_is_fresh(remote_etag):
+        # A truncated cache (interrupted write) or one written before a
+        # schema change would crash every worker here; treat both as a
+        # cache miss and rebuild instead
+        try:
+            with pa.memory_map(cache_path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            table = None
+        if table is not None and not set(used_columns).issubset(table.schema.names):
+            table = None
+    if table is None:
+        table = pa.Table.from_pandas(_clean_data(), preserve_index=False)
+        # Write to a private temp file and rename it into place, so workers
+        # cold-starting concurrently never observe a half-written cache
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, cache_path)
+        if remote_etag:
+            with open(etag_path, 'w') as stored:
+                stored.write(remote_etag)
+    # split_blocks keeps the primitive columns as zero-copy views over the
+    # mapped buffers (strings and categoricals still have to be converted)
+    frame = table.select(used_columns).to_pandas(split_blocks=True, self_destruct=True)
+    # Index on the date so year / year+month filters become binary-search
+    # range slices instead of full-column boolean masks
+    return frame.set_index('Date', drop=False)
+
+data = _load_data()
+
+# Pre-aggregate the summary-table lookups; the set of years and months is
+# fixed once the data is loaded, so there is no reason to group per callback
+yearly_totals = data.groupby('Year', sort=True)['Grand Total'].sum().reset_index()
+year_index = {year: frame for year, frame in data.groupby('Year')}
+year_month_index = {key: frame for key, frame in data.groupby(['Year', 'MonthNum'])}
 
 # Define significant events
 events = [
@@ -44,10 +142,138 @@ events = [
     {"date": datetime.date(2024, 10, 29), "description": "Pre-Election Event"}
 ]
 
-# Initialize the Dash app
-app = Dash(__name__)
+def _vline(date, color):
+    # yref='paper' spans the full plot height, so the shape does not depend
+    # on the filtered data's y-range and can be built once at import time
+    return dict(
+        type="line",
+        x0=date, x1=date,
+        y0=0, y1=1, yref="paper",
+        line=dict(color=color, dash="dash")
+    )
+
+def _vline_label(date, text, color):
+    return dict(
+        x=date,
+        y=1, yref="paper",
+        text=text,
+        showarrow=False,
+        font=dict(size=10, color=color)
+    )
+
+def _overlay_keys(date):
+    # Every (year, month) filter combination under which this date is visible
+    return [
+        (None, None),
+        (date.year, None),
+        (None, date.month),
+        (date.year, date.month)
+    ]
+
+# Precompute the holiday and event overlays once, bucketed by filter key,
+# so callbacks just look them up instead of rescanning the data
+holiday_shapes = defaultdict(list)
+holiday_annotations = defaultdict(list)
+_holiday_rows = data[data['Holiday'] == 'Yes']
+for date, name in zip(_holiday_rows['Date'], _holiday_rows['Holiday_Name']):
+    for key in _overlay_keys(date):
+        holiday_shapes[key].append(_vline(date, "grey"))
+        holiday_annotations[key].append(_vline_label(date, name, "grey"))
+
+event_shapes = defaultdict(list)
+event_annotations = defaultdict(list)
+# One vectorized membership test for all events, rather than an O(N) linear
+# scan of the date column per event
+_event_dates = pd.to_datetime([event["date"] for event in events])
+for event, date, present in zip(events, _event_dates, np.isin(_event_dates.values, data['Date'].values)):
+    if present:
+        for key in _overlay_keys(date):
+            event_shapes[key].append(_vline(date, "blue"))
+            event_annotations[key].append(_vline_label(date, event["description"], "blue"))
+
+# Initialize the Dash app; callbacks run on a diskcache-backed background
+# worker pool so concurrent users are not queued behind each other's updates
+background_callback_manager = DiskcacheManager(diskcache.Cache('./.cache'))
+app = Dash(__name__, background_callback_manager=background_callback_manager)
 server = app.server
 
+# Cache filtered/aggregated data so repeated filter combinations are served
+# instantly; the filesystem backend is shared across workers and the
+# background-callback processes, unlike an in-process SimpleCache
+cache = Cache(app.server, config={'CACHE_TYPE': 'FileSystemCache', 'CACHE_DIR': './.cache/flask'})
+
+@cache.memoize(timeout=3600)
+def _filter_positions(selected_month, selected_year):
+    # Positional row selection for the current filter. Year and year+month
+    # selections are contiguous runs in the sorted DatetimeIndex, resolved by
+    # binary search; only a month without a year still needs a boolean mask
+    if selected_year and selected_month:
+        key = f'{int(selected_year)}-{int(selected_month):02d}'
+        return data.index.slice_indexer(key, key)
+    if selected_year:
+        key = str(int(selected_year))
+        return data.index.slice_indexer(key, key)
+    if selected_month:
+        return np.flatnonzero(data['MonthNum'].values == int(selected_month))
+    return slice(None)
+
+@cache.memoize(timeout=3600)
+def _filter(selected_month, selected_year):
+    return data.iloc[_filter_positions(selected_month, selected_year)]
+
+@njit(cache=True)
+def _argminmax(values):
+    # Fused single-pass argmin/argmax; idxmin + idxmax would scan twice
+    imn = imx = 0
+    mn = mx = values[0]
+    for i in range(1, len(values)):
+        v = values[i]
+        if v < mn:
+            mn = v
+            imn = i
+        elif v > mx:
+            mx = v
+            imx = i
+    return imn, imx
+
+# Warm the JIT so the first callback hits an already-compiled function
+_argminmax(np.zeros(1, dtype=np.int32))
+
+# Ridership modes, in trace order
+modes = ['Bus', 'Rail', 'Grand Total']
+
+# Struct-of-arrays views of the graph columns, aligned to the sorted index;
+# callbacks slice these positionally instead of re-extracting arrays from the
+# DataFrame on every update
+date_arr = data['Date'].to_numpy()
+day_arr = np.array(day_names)[data['DayOfWeek'].to_numpy()]
+mode_arrs = {mode: data[mode].to_numpy() for mode in modes}
+
+def build_figure(positions, selected_modes, shapes=(), annotations=()):
+    # A fresh resampler per call: the figure is a pure function of the filter
+    # inputs, so no mutable state is shared across sessions, gunicorn workers,
+    # or background-callback processes. Each trace is LTTB-downsampled
+    # server-side, bounding what the browser receives however large the
+    # dataset grows
+    fig = FigureResampler(go.Figure())
+    for mode in modes:
+        if mode in selected_modes:
+            fig.add_trace(
+                go.Scatter(mode='lines', name=mode),
+                hf_x=date_arr[positions],
+                hf_y=mode_arrs[mode][positions],
+                hf_hovertext=day_arr[positions]
+            )
+    fig.update_layout(
+        title="Ridership Trends Over Time",
+        xaxis_title="Date",
+        yaxis_title="Ridership Count",
+        hovermode="x unified",
+        shapes=list(shapes),
+        annotations=list(annotations)
+    )
+    return fig
+
 # Layout of the app
 app.layout = html.Div([
     html.H1("Daily Ridership Dashboard", style={'text-align': 'center'}),
@@ -56,7 +282,8 @@ app.layout = html.Div([
         html.Label("Select Month:"),
         dcc.Dropdown(
             id='month-filter',
-            options=[{'label': month, 'value': month} for month in data['Month'].unique()],
+            options=[{'label': month_names[month - 1], 'value': int(month)}
+                     for month in np.sort(data['MonthNum'].unique())],
             value=None,
             placeholder="All Months",
             clearable=True
@@ -100,7 +327,7 @@ app.layout = html.Div([
         )
     ], style={'margin-top': '20px'}),
 
-    dcc.Graph(id='ridership-graph'),
+    dcc.Graph(id='ridership-graph', figure=build_figure(slice(None), modes)),
 
     html.Div([
         html.H3("Ridership Insights"),
@@ -119,77 +346,115 @@ app.layout = html.Div([
     [Input('month-filter', 'value'),
      Input('year-filter', 'value'),
      Input('mode-filter', 'value'),
-     Input('holiday-filter', 'value')]
+     Input('holiday-filter', 'value')],
+    background=True,
+    running=[
+        (Output('month-filter', 'disabled'), True, False),
+        (Output('year-filter', 'disabled'), True, False)
+    ]
 )
 def update_graph(selected_month, selected_year, selected_modes, filters):
-    filtered_data = data.copy()
+    # Apply month and year filters (cached across callbacks)
+    positions = _filter_positions(selected_month, selected_year)
 
-    # Apply month and year filters
-    if selected_month:
-        filtered_data = filtered_data[filtered_data['Month'] == selected_month]
-    if selected_year:
-        filtered_data = filtered_data[filtered_data['Year'] == int(selected_year)]
+    # Look up the precomputed overlays for this filter combination
+    shapes = []
+    annotations = []
+    key = (int(selected_year) if selected_year else None,
+           int(selected_month) if selected_month else None)
+    if 'Holidays' in filters:
+        shapes += holiday_shapes.get(key, [])
+        annotations += holiday_annotations.get(key, [])
+    if 'Events' in filters:
+        shapes += event_shapes.get(key, [])
+        annotations += event_annotations.get(key, [])
 
-    # Create the graph
-    fig = go.Figure()
+    fig = build_figure(positions, selected_modes, shapes, annotations)
 
-    # Plot the ridership data
-    for mode in selected_modes:
-        fig.add_trace(go.Scatter(
-            x=filtered_data['Date'], 
-            y=filtered_data[mode],
-            mode='lines', 
-            name=mode
-        ))
+    # Pre-serialize with plotly's orjson-backed encoder and hand Dash a plain
+    # dict; its default encoder is much slower on datetime-heavy figures
+    return orjson.loads(pio.to_json(fig))
 
-    # Add vertical dotted lines for holidays
-    if 'Holidays' in filters:
-        holiday_data = filtered_data[filtered_data['Holiday'] == 'Yes']
-        for idx, row in holiday_data.iterrows():
-            fig.add_shape(
-                type="line",
-                x0=row['Date'], x1=row['Date'],
-                y0=0, y1=max(filtered_data['Grand Total']),
-                line=dict(color="grey", dash="dash")
-            )
-            fig.add_annotation(
-                x=row['Date'],
-                y=max(filtered_data['Grand Total']),
-                text=row['Holiday_Name'],
-                showarrow=False,
-                font=dict(size=10, color="grey")
-            )
+# Callback to re-resample the traces when the user zooms or pans; rebuilding
+# the resampler from the current filter state keeps it correct in every
+# worker and background process (overlays are untouched by the patch)
+@app.callback(
+    Output('ridership-graph', 'figure', allow_duplicate=True),
+    Input('ridership-graph', 'relayoutData'),
+    [State('month-filter', 'value'),
+     State('year-filter', 'value'),
+     State('mode-filter', 'value')],
+    prevent_initial_call=True
+)
+def resample_graph(relayout_data, selected_month, selected_year, selected_modes):
+    if not relayout_data:
+        return no_update
+    positions = _filter_positions(selected_month, selected_year)
+    fig = build_figure(positions, selected_modes)
+    return fig.construct_update_data_patch(relayout_data)
 
-    # Add vertical dotted lines for events
-    if 'Events' in filters:
-        for event in events:
-            if pd.Timestamp(event["date"]) in filtered_data['Date'].values:
-                fig.add_shape(
-                    type="line",
-                    x0=event["date"], x1=event["date"],
-                    y0=0, y1=max(filtered_data['Grand Total']),
-                    line=dict(color="blue", dash="dash")
-                )
-                fig.add_annotation(
-                    x=event["date"],
-                    y=max(filtered_data['Grand Total']),
-                    text=event["description"],
-                    showarrow=False,
-                    font=dict(size=10, color="blue")
-                )
-
-    # Update layout
-    fig.update_layout(
-        title="Ridership Trends Over Time",
-        xaxis_title="Date",
-        yaxis_title="Ridership Count",
-        hovermode="x unified"
-    )
+# The summary table only ever shows one of these two schemas; re-sending an
+# unchanged columns list makes the DataTable rebuild its header for nothing
+yearly_columns = [
+    {'name': 'Year', 'id': 'Year'},
+    {'name': 'Total Ridership', 'id': 'Grand Total'}
+]
+insight_columns = [
+    {'name': 'Insight', 'id': 'Insight'},
+    {'name': 'Date', 'id': 'Date'},
+    {'name': 'Day', 'id': 'Day'},
+    {'name': 'Grand Total', 'id': 'Grand Total'}
+]
+def _columns_out(columns, current_columns):
+    # Return no_update when the schema matches what this client already has
+    return no_update if columns == current_columns else columns
 
-    return fig
+# Callback to update the summary table based on filters
+@app.callback(
+    [Output('summary-table', 'data'),
+     Output('summary-table', 'columns')],
+    [Input('month-filter', 'value'),
+     Input('year-filter', 'value')],
+    State('summary-table', 'columns'),
+    background=True
+)
+def update_table(selected_month, selected_year, current_columns):
+    # Without filters, show total ridership per year (pre-aggregated at load)
+    if not selected_month and not selected_year:
+        return yearly_totals.to_dict('records'), _columns_out(yearly_columns, current_columns)
+
+    # With filters, show the busiest and quietest days in the selection,
+    # reading from the precomputed per-year / per-year-month slices
+    if selected_year and selected_month:
+        filtered_data = year_month_index.get((int(selected_year), int(selected_month)))
+    elif selected_year:
+        filtered_data = year_index.get(int(selected_year))
+    else:
+        filtered_data = _filter(selected_month, selected_year)
+    if filtered_data is None or filtered_data.empty:
+        return [], _columns_out(insight_columns, current_columns)
+
+    imn, imx = _argminmax(filtered_data['Grand Total'].to_numpy())
+    busiest = filtered_data.iloc[imx]
+    quietest = filtered_data.iloc[imn]
+    rows = [
+        {
+            'Insight': 'Busiest Day',
+            'Date': busiest['Date'].strftime('%B %d, %Y'),
+            'Day': day_names[busiest['DayOfWeek']],
+            'Grand Total': int(busiest['Grand Total'])
+        },
+        {
+            'Insight': 'Quietest Day',
+            'Date': quietest['Date'].strftime('%B %d, %Y'),
+            'Day': day_names[quietest['DayOfWeek']],
+            'Grand Total': int(quietest['Grand Total'])
+        }
+    ]
+    return rows, _columns_out(insight_columns, current_columns)
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    app.run(debug=True)
 # Expose the Flask server instance
 
 